@@ -3,6 +3,13 @@ ASGI config for project01 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project with an ASGI server (e.g. ``uvicorn project01.asgi:application``)
+to use the Server-Sent Events stream at ``/api/events``; under WSGI every
+connected client would hold a worker. Events reach the stream through
+``TODO_EVENTS_BACKEND``: the default database backend also carries the
+changes of other workers, ``run_jobs`` and ``import_todos``, while
+``LocalBackend`` only streams the changes made by this process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
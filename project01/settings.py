@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "todoApp.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -111,6 +112,33 @@ REST_FRAMEWORK = {
     ],
 }
 
+# To-Do change events (Server-Sent Events at /api/events, needs an ASGI server)
+# The database backend relays the events of every process (web workers,
+# run_jobs, import_todos) through the TodoEvent table, polled by the processes
+# serving streams. "todoApp.events.LocalBackend" skips the table but only
+# delivers events published by the serving process itself: changes made by
+# jobs, imports or other workers are then never streamed.
+TODO_EVENTS_BACKEND = "todoApp.events.DatabaseBackend"
+TODO_EVENTS_POLL_INTERVAL = 0.5  # seconds between two reads of the table
+TODO_EVENTS_RETENTION = 300  # seconds before written events are deleted
+TODO_EVENTS_BUFFER_SIZE = 100  # events kept per client before dropping
+TODO_EVENTS_HEARTBEAT = 15  # seconds between keep-alive comments
+
+# Directory shared by the worker processes to aggregate their metrics,
+# leave unset when running a single process
+TODO_METRICS_DIR = None
+
+# Where export jobs write their files
+TODO_EXPORT_DIR = BASE_DIR / "exports"
+
+# Serve filtered and paged To-Do lists from an in-memory columnar snapshot
+# of each owner's To-Dos (see todoApp/snapshot.py). Each process keeps its own
+# copy and rebuilds an owner's columns on a background thread when that
+# owner's version in the database changes or they are older than MAX_AGE;
+# lists are served by the database meanwhile. Worth it for large, read-heavy
+# tables only.
+TODO_SNAPSHOT_ENABLED = False
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -17,8 +17,10 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from todoApp.metrics import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("todoApp.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TodoappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "todoApp"
+
+    def ready(self):
+        # Connect the signal handlers keeping the tag caches up to date
+        from . import tagindex, tagquery  # noqa: F401
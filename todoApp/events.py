@@ -0,0 +1,217 @@
+"""
+Broadcast hub for To-Do change events, consumed by the SSE endpoint.
+
+Writers publish events inside their transaction. The hub hands them to a
+backend, which must call ``hub.deliver(event)`` in every process that serves
+subscribers once the transaction commits:
+
+- ``DatabaseBackend`` (the default in settings) writes each event to the
+  ``TodoEvent`` table in the writer's transaction, so an event is visible
+  exactly when its change is. Every process with subscribers polls the
+  table from a background thread. This is what carries the events of
+  ``manage.py run_jobs`` workers, of ``import_todos`` and of the other web
+  workers to the processes serving the streams.
+- ``LocalBackend`` only delivers inside the publishing process. It is enough
+  for a single web process when no jobs or imports run next to it.
+
+Each subscriber has a bounded buffer. When a slow client lets it fill up
+the oldest events are dropped and the client is told to resync. Bulk writes
+that do not describe every row publish a ``resync`` event instead.
+"""
+
+import asyncio
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import TodoEvent
+
+logger = logging.getLogger(__name__)
+
+# Events read per query by the poller
+POLL_BATCH = 500
+
+# Seconds between two deletes of old events by one process
+PRUNE_INTERVAL = 60.0
+
+
+class LocalBackend:
+    """Deliver events to the subscribers of this process only."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, event):
+        transaction.on_commit(lambda: self.hub.deliver(event))
+
+    def start(self):
+        pass
+
+
+class DatabaseBackend:
+    """Relay events between processes through the ``TodoEvent`` table."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.last_id = None
+        self._pruned_at = time.monotonic()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        # In the writer's transaction, a rollback drops the event too
+        TodoEvent.objects.create(owner_id=event["owner"], data=event)
+        self.prune()
+
+    def prune(self, force=False):
+        # Subscribers only need the events written since their last poll
+        now = time.monotonic()
+        if not force and now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        retention = getattr(settings, "TODO_EVENTS_RETENTION", 300)
+        cutoff = timezone.now() - datetime.timedelta(seconds=retention)
+        TodoEvent.objects.filter(created_at__lt=cutoff).delete()
+
+    def poll(self):
+        # Deliver the events committed since the last poll, returns how many.
+        # Relies on ids becoming visible in order, which holds on SQLite
+        # where writes are serialized.
+        events = TodoEvent.objects.order_by("id")
+        if self.last_id is None:
+            # Subscribers only get what happens after they connected
+            self.last_id = events.aggregate(last=Max("id"))["last"] or 0
+            return 0
+        rows = list(
+            events.filter(id__gt=self.last_id).values_list("id", "data")[:POLL_BATCH]
+        )
+        for event_id, event in rows:
+            self.hub.deliver(event)
+            self.last_id = event_id
+        return len(rows)
+
+    def start(self):
+        # Called for every subscriber, polls from the first one on
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="todo-events", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, "TODO_EVENTS_POLL_INTERVAL", 0.5)
+        while True:
+            try:
+                if self.poll() < POLL_BATCH:
+                    time.sleep(interval)
+            except DatabaseError:
+                logger.exception("Could not read the To-Do events")
+                close_old_connections()
+                time.sleep(interval)
+
+
+class Subscription:
+    def __init__(self, owner_id, status=None, tag=None, maxsize=100):
+        self.owner_id = owner_id
+        self.status = status
+        self.tag = tag
+        self.dropped = 0
+        self._buffer = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._wakeup_pending = False
+
+    def matches(self, event):
+        # Filters only apply to fields the event carries
+        if event["owner"] != self.owner_id:
+            return False
+        if self.status and "status" in event and event["status"] != self.status:
+            return False
+        if self.tag and "tags" in event and self.tag not in event["tags"]:
+            return False
+        return True
+
+    def push(self, event):
+        # Called from any thread, never blocks the publisher
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(event)
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The event loop of this subscriber is gone
+            pass
+
+    async def get(self, timeout):
+        # Wait for events, returns (events, dropped) or ([], 0) on timeout
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return [], 0
+        with self._lock:
+            self._ready.clear()
+            self._wakeup_pending = False
+            events = list(self._buffer)
+            self._buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventHub:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        path = getattr(settings, "TODO_EVENTS_BACKEND", "todoApp.events.LocalBackend")
+        if self._backend is None or self._backend[0] != path:
+            self._backend = (path, import_string(path)(self))
+        return self._backend[1]
+
+    def subscribe(self, owner_id, status=None, tag=None):
+        maxsize = getattr(settings, "TODO_EVENTS_BUFFER_SIZE", 100)
+        subscription = Subscription(owner_id, status, tag, maxsize)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self.backend.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.backend.publish(event)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.push(event)
+
+
+hub = EventHub()
+
+
+def publish_todo_event(kind, todo_id, owner_id, **fields):
+    # Call inside the transaction of the change, subscribers get the event
+    # once it commits
+    event = {"type": kind, "id": todo_id, "owner": owner_id, **fields}
+    hub.publish(event)
@@ -0,0 +1,240 @@
+"""
+Background jobs for bulk operations on To-Do items.
+
+Jobs are rows of the ``Job`` table. Workers (``manage.py run_jobs``) claim
+queued jobs with a conditional UPDATE, so several workers can share the
+table, and run them in chunks of ``CHUNK_SIZE`` items. Between chunks the
+handler records its progress and stops when a cancel was requested. A job
+whose worker stopped sending heartbeats is queued again; handlers are
+written so that running a job twice is harmless.
+"""
+
+import datetime
+import json
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_todo_event
+from .models import Job, Todo
+from .snapshot import todos_changed
+from .tagindex import owner_tags_changed
+from .tagquery import todos_deleting
+from .validators import STATUS_VALUES, parse_due_date
+
+CHUNK_SIZE = 500
+
+# Subtrees removed per DELETE, keeps the OR of path ranges short
+PATH_BATCH = 100
+
+# A running job without heartbeat for this long is given to another worker
+STALE_AFTER = datetime.timedelta(minutes=5)
+
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+
+    return register
+
+
+def validate_params(kind, params):
+    # Returns an error message, or None when the job can be queued
+    if kind not in HANDLERS:
+        return "Kind should be one of the following: " + ", ".join(
+            f"'{name}'" for name in HANDLERS
+        )
+    if not isinstance(params, dict):
+        return "Params should be an object!"
+    if "status" in params and params["status"] not in STATUS_VALUES:
+        return "Filter status is not a valid status!"
+    if "tag" in params and not isinstance(params["tag"], str):
+        return "Filter tag should be a tag name!"
+    if "due_before" in params:
+        try:
+            parse_due_date(params["due_before"])
+        except ValueError as e:
+            return str(e)
+    if kind == "bulk_status" and params.get("new_status") not in STATUS_VALUES:
+        return "New status is not a valid status!"
+    return None
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_next(worker):
+    # Atomically move the oldest queued job to RUNNING for this worker
+    now = timezone.now()
+    Job.objects.filter(status="RUNNING", heartbeat_at__lt=now - STALE_AFTER).update(
+        status="QUEUED", worker=""
+    )
+    while True:
+        job_id = (
+            Job.objects.filter(status="QUEUED")
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(id=job_id, status="QUEUED").update(
+            status="RUNNING", worker=worker, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+        # Another worker was faster, try the next one
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total=None):
+        # Record progress and stop if a cancel was requested
+        fields = {"done": done, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["total"] = total
+        Job.objects.filter(id=self.job.id).update(**fields)
+        if Job.objects.filter(id=self.job.id, cancel_requested=True).exists():
+            raise JobCancelled
+
+
+def run_job(job):
+    context = JobContext(job)
+    try:
+        result = HANDLERS[job.kind](job, context)
+    except JobCancelled:
+        fields = {"status": "CANCELLED"}
+    except Exception as e:
+        fields = {"status": "FAILED", "error": f"{type(e).__name__}: {e}"}
+    else:
+        fields = {"status": "SUCCEEDED", "result": result}
+    Job.objects.filter(id=job.id).update(finished_at=timezone.now(), **fields)
+
+
+def run_pending(worker=None, max_jobs=None):
+    # Run queued jobs until there are none left, returns how many ran
+    worker = worker or worker_name()
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def todos_for(job):
+    todos = Todo.objects.filter(owner_id=job.owner_id)
+    params = job.params
+    if "status" in params:
+        todos = todos.filter(status=params["status"])
+    if "tag" in params:
+        todos = todos.filter(tags__name=params["tag"])
+    if "due_before" in params:
+        todos = todos.filter(due_date__lt=parse_due_date(params["due_before"]))
+    return todos
+
+
+def chunks(todos, context):
+    # Yield lists of ids in primary key order, reporting progress in between
+    total = todos.count()
+    done = 0
+    last_id = 0
+    context.progress(done, total)
+    while True:
+        ids = list(
+            todos.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:CHUNK_SIZE]
+        )
+        if not ids:
+            break
+        yield ids
+        last_id = ids[-1]
+        done += len(ids)
+        context.progress(done)
+
+
+@handler("bulk_delete")
+def bulk_delete(job, context):
+    deleted = 0
+    for ids in chunks(todos_for(job), context):
+        with transaction.atomic():
+            # Subtasks go with their parent, like in deletetodo
+            for i in range(0, len(ids), PATH_BATCH):
+                paths = Todo.objects.filter(id__in=ids[i : i + PATH_BATCH])
+                subtrees = Todo.objects.subtrees(paths.values_list("path", flat=True))
+                subtree_ids = list(subtrees.values_list("id", flat=True))
+                todos_deleting(subtrees)
+                subtrees.skip_occurrences()
+                deleted += subtrees.delete()[1].get(Todo._meta.label, 0)
+                for todo_id in subtree_ids:
+                    publish_todo_event("deleted", todo_id, job.owner_id)
+            todos_changed([job.owner_id])
+            owner_tags_changed([job.owner_id])
+    return {"deleted": deleted}
+
+
+@handler("bulk_status")
+def bulk_status(job, context):
+    new_status = job.params["new_status"]
+    updated = 0
+    for ids in chunks(todos_for(job), context):
+        with transaction.atomic():
+            updated += Todo.objects.filter(id__in=ids).update(
+                status=new_status, version=F("version") + 1
+            )
+            for todo_id in ids:
+                publish_todo_event("updated", todo_id, job.owner_id, status=new_status)
+            todos_changed([job.owner_id])
+    return {"updated": updated}
+
+
+@handler("export")
+def export(job, context):
+    # Write NDJSON that import_todos can read back
+    directory = settings.TODO_EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"todos-{job.id}.ndjson")
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            exported = write_export(f, todos_for(job), context)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return {"exported": exported, "file": os.path.basename(path)}
+
+
+def write_export(f, todos, context):
+    exported = 0
+    for ids in chunks(todos, context):
+        tags = {}
+        for todo_id, name in Todo.tags.through.objects.filter(
+            todo_id__in=ids
+        ).values_list("todo_id", "tag__name"):
+            tags.setdefault(todo_id, []).append(name)
+        rows = Todo.objects.filter(id__in=ids).order_by("id")
+        for row in rows.values("id", "title", "description", "due_date", "status"):
+            row["tags"] = tags.get(row.pop("id"), [])
+            f.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+        exported += len(ids)
+    return exported
@@ -0,0 +1,273 @@
+import csv
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from todoApp.events import publish_todo_event
+from todoApp.models import ImportCheckpoint, Tag, Todo
+from todoApp.snapshot import todos_changed
+from todoApp.tagindex import tag_index
+from todoApp.validators import validate_new_todo
+
+# Number of names looked up per query, keeps us below SQLite's variable limit
+LOOKUP_BATCH = 500
+
+
+class TagCache:
+    """Bounded LRU mapping of tag name to tag id."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+
+    def get(self, name):
+        tag_id = self._ids.get(name)
+        if tag_id is not None:
+            self._ids.move_to_end(name)
+        return tag_id
+
+    def put(self, name, tag_id):
+        self._ids[name] = tag_id
+        self._ids.move_to_end(name)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def resolve(self, names):
+        # Return {name: id} for all names, creating the missing tags
+        resolved = {}
+        missing = []
+        for name in names:
+            tag_id = self.get(name)
+            if tag_id is None:
+                missing.append(name)
+            else:
+                resolved[name] = tag_id
+        if missing:
+            found = self._lookup(missing)
+            new_names = [name for name in missing if name not in found]
+            if new_names:
+                Tag.objects.bulk_create(
+                    [Tag(name=name) for name in new_names],
+                    batch_size=LOOKUP_BATCH,
+                    ignore_conflicts=True,
+                )
+                found.update(self._lookup(new_names))
+            for name, tag_id in found.items():
+                self.put(name, tag_id)
+            resolved.update(found)
+        return resolved
+
+    def _lookup(self, names):
+        found = {}
+        for i in range(0, len(names), LOOKUP_BATCH):
+            found.update(
+                Tag.objects.filter(name__in=names[i : i + LOOKUP_BATCH]).values_list(
+                    "name", "id"
+                )
+            )
+        return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream To-Do items from an NDJSON or CSV file into the database. "
+        "Rows are validated with the same rules as the addtodo endpoint and "
+        "written in chunks. Progress is saved in the database in the same "
+        "transaction as every chunk, so an interrupted import resumes exactly "
+        "where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' reads stdin.")
+        parser.add_argument(
+            "--owner", required=True, help="Username owning the imported items."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Input format, guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--tag-cache-size",
+            type=int,
+            default=10000,
+            help="Maximum number of tag name to id entries kept in memory.",
+        )
+        parser.add_argument(
+            "--tag-separator",
+            default=",",
+            help="Separator of the tags column in CSV files.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name, defaults to the absolute path of the file.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the first row.",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="Write rejected rows to this NDJSON file instead of stderr.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1 or options["tag_cache_size"] < 1:
+            raise CommandError("--chunk-size and --tag-cache-size must be positive.")
+
+        User = get_user_model()
+        try:
+            self.owner = User.objects.get(**{User.USERNAME_FIELD: options["owner"]})
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['owner']}' does not exist.")
+
+        fmt = options["format"]
+        if fmt is None:
+            fmt = "csv" if path.lower().endswith(".csv") else "ndjson"
+
+        checkpoint = options["checkpoint"]
+        if checkpoint is None and path != "-":
+            checkpoint = os.path.abspath(path)
+
+        state = {"rows": 0, "imported": 0, "rejected": 0, "rejects_size": 0}
+        if checkpoint and options["restart"]:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        elif checkpoint:
+            saved = ImportCheckpoint.objects.filter(name=checkpoint).first()
+            if saved is not None:
+                state.update((key, getattr(saved, key)) for key in state)
+                self.stdout.write(f"Resuming after row {state['rows']}")
+
+        self.tags = TagCache(options["tag_cache_size"])
+        self.rejects = None
+        if options["rejects"]:
+            self.rejects = open(options["rejects"], "a" if state["rows"] else "w")
+            # Drop rejects written for a chunk that did not commit
+            if self.rejects.tell() > state["rejects_size"]:
+                self.rejects.truncate(state["rejects_size"])
+
+        source = sys.stdin if path == "-" else open(path, newline="")
+        try:
+            if fmt == "csv":
+                records = self.read_csv(source, options["tag_separator"])
+            else:
+                records = self.read_ndjson(source)
+
+            chunk = []
+            for row_number, data, error in records:
+                if row_number <= state["rows"]:
+                    continue
+                if error is None:
+                    cleaned, error = validate_new_todo(data)
+                if error:
+                    self.reject(row_number, data, error)
+                    state["rejected"] += 1
+                else:
+                    chunk.append(cleaned)
+                state["rows"] = row_number
+                if len(chunk) >= chunk_size:
+                    self.flush(chunk, state, checkpoint)
+                    chunk = []
+            self.flush(chunk, state, checkpoint)
+        finally:
+            # bulk_create sends no signals, let the tag caches catch up
+            tag_index.invalidate()
+            if source is not sys.stdin:
+                source.close()
+            if self.rejects:
+                self.rejects.close()
+
+        if checkpoint:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {state['imported']} To-Do items, "
+                f"rejected {state['rejected']} rows."
+            )
+        )
+
+    def read_ndjson(self, source):
+        for row_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                yield row_number, line.rstrip("\n"), "Invalid JSON format"
+                continue
+            if not isinstance(data, dict):
+                yield row_number, data, "Invalid JSON format"
+                continue
+            yield row_number, data, None
+
+    def read_csv(self, source, separator):
+        reader = csv.DictReader(source)
+        for row_number, row in enumerate(reader, 1):
+            # Empty cells fall back to the API defaults
+            data = {key: value for key, value in row.items() if key and value}
+            if "tags" in data:
+                data["tags"] = data["tags"].split(separator)
+            yield row_number, data, None
+
+    def reject(self, row_number, data, error):
+        if self.rejects:
+            self.rejects.write(
+                json.dumps({"row": row_number, "error": error, "data": data}) + "\n"
+            )
+        else:
+            self.stderr.write(f"Row {row_number}: {error}")
+
+    def flush(self, chunk, state, checkpoint):
+        if self.rejects:
+            # Rejects must be on disk before the checkpoint counts them
+            self.rejects.flush()
+            os.fsync(self.rejects.fileno())
+            state["rejects_size"] = self.rejects.tell()
+        with transaction.atomic():
+            if chunk:
+                tag_ids = self.tags.resolve(
+                    list(dict.fromkeys(name for row in chunk for name in row["tags"]))
+                )
+                todos = Todo.objects.bulk_create(
+                    [
+                        Todo(
+                            owner=self.owner,
+                            title=row["title"],
+                            description=row["description"],
+                            due_date=row["due_date"],
+                            status=row["status"],
+                        )
+                        for row in chunk
+                    ]
+                )
+                Through = Todo.tags.through
+                Through.objects.bulk_create(
+                    [
+                        Through(todo_id=todo.id, tag_id=tag_ids[name])
+                        for todo, row in zip(todos, chunk)
+                        for name in row["tags"]
+                    ],
+                    batch_size=LOOKUP_BATCH,
+                )
+                Todo.objects.fill_paths()
+                state["imported"] += len(chunk)
+                # One event per chunk, subscribers refetch their lists
+                publish_todo_event("resync", None, self.owner.id, imported=len(chunk))
+                todos_changed([self.owner.id])
+            if checkpoint:
+                ImportCheckpoint.objects.update_or_create(
+                    name=checkpoint, defaults=state
+                )
+        self.stdout.write(
+            f"Processed {state['rows']} rows: {state['imported']} imported, "
+            f"{state['rejected']} rejected"
+        )
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from todoApp.jobs import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs. Each thread claims jobs from the database, "
+        "so any number of workers can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=1, help="Number of worker threads."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads must be positive.")
+        self.stopping = threading.Event()
+        try:
+            if options["threads"] == 1:
+                self.work(options, close_connection=False)
+                return
+            threads = [
+                threading.Thread(target=self.work, args=(options,), daemon=True)
+                for _ in range(options["threads"])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Running jobs are queued again once their heartbeat goes stale
+            self.stopping.set()
+            self.stdout.write("Stopping workers...")
+
+    def work(self, options, close_connection=True):
+        worker = worker_name()
+        try:
+            while not self.stopping.is_set():
+                ran = run_pending(worker)
+                if ran:
+                    self.stdout.write(f"{worker} ran {ran} job(s)")
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+                close_old_connections()
+        finally:
+            if close_connection:
+                connection.close()
@@ -0,0 +1,218 @@
+"""
+Request metrics per URL name, exposed in the Prometheus text format.
+
+``MetricsMiddleware`` records request counts, errors, latency, response
+size and the number of database queries of every request. Recording only
+takes a lock and bumps a few integers. When the ``TODO_METRICS_DIR`` setting
+points to a directory shared by the worker processes, each process dumps
+its totals there (at most once per ``FLUSH_INTERVAL``) and the ``/metrics``
+view sums the files of all processes.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Seconds between two dumps of this process' totals to TODO_METRICS_DIR
+FLUSH_INTERVAL = 1.0
+
+HISTOGRAMS = (
+    (
+        "latency",
+        "todo_http_request_duration_seconds",
+        "Time spent handling the request.",
+        LATENCY_BUCKETS,
+    ),
+    (
+        "size",
+        "todo_http_response_size_bytes",
+        "Size of the response body.",
+        SIZE_BUCKETS,
+    ),
+    (
+        "queries",
+        "todo_db_queries_per_request",
+        "Database queries executed by the request.",
+        QUERY_BUCKETS,
+    ),
+)
+
+
+def _new_histogram(buckets):
+    # Counts per bucket (the last one is +Inf) followed by the sum
+    return [0] * (len(buckets) + 1) + [0]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # (view, method, status) -> count
+            self.errors = {}  # view -> count
+            self.histograms = {name: {} for name, _, _, _ in HISTOGRAMS}
+            self._flushed_at = 0.0
+
+    def record(self, view, method, status, latency, size, queries):
+        with self._lock:
+            key = (view, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if status >= 500:
+                self.errors[view] = self.errors.get(view, 0) + 1
+            for (name, _, _, buckets), value in zip(
+                HISTOGRAMS, (latency, size, queries)
+            ):
+                if value is None:
+                    continue
+                histogram = self.histograms[name].get(view)
+                if histogram is None:
+                    histogram = self.histograms[name][view] = _new_histogram(buckets)
+                histogram[bisect_left(buckets, value)] += 1
+                histogram[-1] += value
+        directory = getattr(settings, "TODO_METRICS_DIR", None)
+        if directory and time.monotonic() - self._flushed_at > FLUSH_INTERVAL:
+            self.flush(directory)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "errors": dict(self.errors),
+                "histograms": {
+                    name: {view: list(values) for view, values in views.items()}
+                    for name, views in self.histograms.items()
+                },
+            }
+
+    def flush(self, directory):
+        # Atomically replace this process' file in the shared directory
+        self._flushed_at = time.monotonic()
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        # Totals of this process, or of all processes sharing TODO_METRICS_DIR
+        directory = getattr(settings, "TODO_METRICS_DIR", None)
+        if not directory:
+            return self.snapshot()
+        self.flush(directory)
+        totals = {"requests": [], "errors": {}, "histograms": {}}
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith("metrics-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    _merge(totals, json.load(f))
+            except (OSError, ValueError):
+                # Being replaced by its process or unreadable, skip it
+                continue
+        return totals
+
+
+def _merge(totals, snapshot):
+    requests = {tuple(row[:3]): row[3] for row in totals["requests"]}
+    for *key, count in snapshot["requests"]:
+        requests[tuple(key)] = requests.get(tuple(key), 0) + count
+    totals["requests"] = [[*key, count] for key, count in requests.items()]
+    for view, count in snapshot["errors"].items():
+        totals["errors"][view] = totals["errors"].get(view, 0) + count
+    for name, views in snapshot["histograms"].items():
+        merged = totals["histograms"].setdefault(name, {})
+        for view, values in views.items():
+            if view in merged:
+                merged[view] = [a + b for a, b in zip(merged[view], values)]
+            else:
+                merged[view] = list(values)
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    # Sync only on purpose: under ASGI Django then runs it in the same
+    # thread as the (sync) views, so their queries can be counted
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, queries.count)
+        return response
+
+    def record(self, request, response, latency, queries):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        # Streaming responses are measured until their headers are ready
+        size = None if response.streaming else len(response.content)
+        registry.record(
+            view, request.method, response.status_code, latency, size, queries
+        )
+
+
+def _labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+
+
+def render(totals):
+    lines = [
+        "# HELP todo_http_requests_total Requests handled.",
+        "# TYPE todo_http_requests_total counter",
+    ]
+    for view, method, status, count in sorted(totals["requests"]):
+        labels = _labels(view=view, method=method, status=status)
+        lines.append(f"todo_http_requests_total{{{labels}}} {count}")
+
+    lines += [
+        "# HELP todo_http_errors_total Requests that ended with a server error.",
+        "# TYPE todo_http_errors_total counter",
+    ]
+    for view, count in sorted(totals["errors"].items()):
+        lines.append(f"todo_http_errors_total{{{_labels(view=view)}}} {count}")
+
+    for name, metric, help_text, buckets in HISTOGRAMS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for view, values in sorted(totals["histograms"].get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), values):
+                cumulative += count
+                labels = _labels(view=view, le=bound)
+                lines.append(f"{metric}_bucket{{{labels}}} {cumulative}")
+            lines.append(f"{metric}_sum{{{_labels(view=view)}}} {values[-1]}")
+            lines.append(f"{metric}_count{{{_labels(view=view)}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    return HttpResponse(
+        render(registry.collect()), content_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0005_rename_tag_todo_tags"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                condition=models.Q(
+                    ("due_date__isnull", False),
+                    models.Q(("status__in", ["COMPLETED", "CANCELLED"]), _negated=True),
+                ),
+                fields=["due_date"],
+                name="todo_actionable_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_existing_todos(apps, schema_editor):
+    # Todos created before ownership go to the first superuser, or to the
+    # first user when there is no superuser yet
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Todo = apps.get_model("todoApp", "Todo")
+    users = User.objects.order_by("-is_superuser", "id")
+    owner = users.first()
+    if owner is not None:
+        Todo.objects.filter(owner__isnull=True).update(owner=owner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0006_todo_actionable_due_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="todo",
+            name="todo_actionable_due_idx",
+        ),
+        migrations.AddField(
+            model_name="todo",
+            name="owner",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="todos",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(assign_existing_todos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                condition=models.Q(
+                    ("due_date__isnull", False),
+                    models.Q(("status__in", ["COMPLETED", "CANCELLED"]), _negated=True),
+                ),
+                fields=["owner", "due_date"],
+                name="todo_owner_actionable_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                fields=["owner", "status", "due_date"], name="todo_owner_status_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                fields=["owner", "created_at", "id"], name="todo_owner_created_idx"
+            ),
+        ),
+    ]
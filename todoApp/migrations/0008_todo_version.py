@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0007_todo_owner"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="todo",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0009_job"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "frequency",
+                    models.CharField(
+                        choices=[
+                            ("DAILY", "Daily"),
+                            ("WEEKLY", "Weekly"),
+                            ("MONTHLY", "Monthly"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("interval", models.PositiveIntegerField(default=1)),
+                ("until", models.DateField(blank=True, null=True)),
+                ("count", models.PositiveIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="todo",
+            name="occurrence_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="todo",
+            name="series",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="occurrences",
+                to="todoApp.todo",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="todo",
+            constraint=models.UniqueConstraint(
+                fields=("series", "occurrence_date"), name="todo_series_occurrence_uniq"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recurrence",
+            name="todo",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recurrence",
+                to="todoApp.todo",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def set_root_paths(apps, schema_editor):
+    # Every existing todo becomes a root, in one UPDATE
+    Todo = apps.get_model("todoApp", "Todo")
+    Todo.objects.filter(path="").update(
+        path=Concat(LPad(Cast("id", CharField()), 12, Value("0")), Value("/"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0010_recurrence"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="todo",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="todo",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="todoApp.todo",
+            ),
+        ),
+        migrations.AddField(
+            model_name="todo",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=403),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(fields=["path"], name="todo_path_idx"),
+        ),
+    ]
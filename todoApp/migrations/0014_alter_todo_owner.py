@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+ORPHANS_USERNAME = "unowned-todos"
+
+
+def assign_orphaned_todos(apps, schema_editor):
+    # Todos left without owner because no user existed when 0007 ran go to
+    # the first superuser or user, else to an inactive placeholder user that
+    # an admin can reassign them from
+    Todo = apps.get_model("todoApp", "Todo")
+    if not Todo.objects.filter(owner__isnull=True).exists():
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    owner = User.objects.order_by("-is_superuser", "id").first()
+    if owner is None:
+        owner = User.objects.create(
+            username=ORPHANS_USERNAME,
+            password="!",  # unusable password
+            is_active=False,
+        )
+    Todo.objects.filter(owner__isnull=True).update(owner=owner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0013_sharedversion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_orphaned_todos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="todo",
+            name="owner",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="todos",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todoApp", "0015_todoevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SkippedOccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("occurrence_date", models.DateField()),
+                (
+                    "series",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="skipped_occurrences",
+                        to="todoApp.todo",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("series", "occurrence_date"),
+                        name="skipped_occurrence_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,7 +1,93 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import CharField, F, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Concat, LPad, Substr
 from django.core.exceptions import ValidationError
+import calendar
 import datetime
 
+# Statuses after which a To-Do needs no further action
+TERMINAL_STATUSES = ["COMPLETED", "CANCELLED"]
+
+# Materialized paths are the zero padded ids from the root, each followed
+# by a "/", e.g. "000000000003/000000000042/"
+PATH_WIDTH = 12
+MAX_DEPTH = 30
+
+
+def path_segment(id):
+    return str(id).zfill(PATH_WIDTH) + "/"
+
+
+def path_upper_bound(path):
+    # "0" sorts right after "/", so [path, upper bound) holds exactly the
+    # paths starting with path and a plain index range scan finds them
+    return path[:-1] + "0"
+
+
+def _sql_literal(value):
+    # SQLite only matches a partial index when the query repeats the
+    # index condition with the same literals, bound parameters don't match
+    return RawSQL("'%s'" % value.replace("'", "''"), ())
+
+
+class TodoQuerySet(models.QuerySet):
+    def concrete(self):
+        # Real To-Dos, without the templates of recurring series
+        return self.filter(recurrence__isnull=True)
+
+    def templates(self):
+        return self.filter(recurrence__isnull=False)
+
+    def subtree(self, path):
+        # The node with this path and all of its descendants. Subtasks always
+        # belong to the owner of their root, so callers check the root only:
+        # any other filter lets SQLite pick a worse index than todo_path_idx
+        return self.filter(path__gte=path, path__lt=path_upper_bound(path))
+
+    def subtrees(self, paths):
+        # Union of the subtrees, one index range per path
+        condition = Q()
+        for path in paths:
+            condition |= Q(path__gte=path, path__lt=path_upper_bound(path))
+        return self.filter(condition) if condition else self.none()
+
+    def skip_occurrences(self):
+        # Call before deleting: remembers the dates of the occurrences of
+        # recurring series among these rows, so they are not computed again
+        SkippedOccurrence.objects.bulk_create(
+            [
+                SkippedOccurrence(series_id=series_id, occurrence_date=date)
+                for series_id, date in self.filter(series__isnull=False).values_list(
+                    "series_id", "occurrence_date"
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+    def fill_paths(self):
+        # Give root paths to rows saved without one (bulk_create skips save)
+        return self.filter(path="").update(
+            path=Concat(
+                LPad(Cast("id", CharField()), PATH_WIDTH, Value("0")), Value("/")
+            ),
+            depth=0,
+        )
+
+    def actionable(self):
+        # Same condition as the partial index so the planner can use it
+        return self.filter(due_date__isnull=False).exclude(
+            status__in=[_sql_literal(status) for status in TERMINAL_STATUSES]
+        )
+
+    def due_within(self, days):
+        # Open To-Dos that are overdue or due in the next `days` days
+        until = datetime.date.today() + datetime.timedelta(days=days)
+        return self.actionable().filter(due_date__lte=until).order_by("due_date", "id")
+
+
 class Todo(models.Model):
     STATUS_CHOICES = [
         ("OPEN", "Open"),
@@ -14,22 +100,253 @@ class Todo(models.Model):
     title = models.CharField(max_length=100, blank=False)
     description = models.TextField(max_length=1000, blank=False)
     due_date = models.DateField(null=True, blank=True)
-    status = models.CharField(
-        max_length=20, choices=STATUS_CHOICES, default="OPEN")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="OPEN")
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     tags = models.ManyToManyField("Tag", related_name="todos")
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="todos",
+    )
+    # Bumped on every update, used for optimistic concurrency control
+    version = models.PositiveIntegerField(default=1)
+    # Set on occurrences of a recurring series that were edited or completed
+    series = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        related_name="occurrences",
+        null=True,
+        blank=True,
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
+    # Subtasks: parent plus the materialized path of ids from the root
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        related_name="children",
+        null=True,
+        blank=True,
+    )
+    path = models.CharField(
+        max_length=(PATH_WIDTH + 1) * (MAX_DEPTH + 1), default="", editable=False
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = TodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "due_date"],
+                name="todo_owner_actionable_due_idx",
+                condition=Q(due_date__isnull=False) & ~Q(status__in=TERMINAL_STATUSES),
+            ),
+            models.Index(
+                fields=["owner", "status", "due_date"],
+                name="todo_owner_status_due_idx",
+            ),
+            models.Index(
+                fields=["owner", "created_at", "id"],
+                name="todo_owner_created_idx",
+            ),
+            models.Index(fields=["path"], name="todo_path_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["series", "occurrence_date"],
+                name="todo_series_occurrence_uniq",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            # The path needs the id, so it is written right after the insert
+            parent = self.parent
+            self.path = (parent.path if parent else "") + path_segment(self.id)
+            self.depth = parent.depth + 1 if parent else 0
+            Todo.objects.filter(id=self.id).update(path=self.path, depth=self.depth)
+
+    def move_to(self, parent):
+        # Re-parent this node, its descendants follow in a single UPDATE
+        old_path = self.path
+        new_path = (parent.path if parent else "") + path_segment(self.id)
+        delta = (parent.depth + 1 if parent else 0) - self.depth
+        Todo.objects.filter(id=self.id).update(parent=parent)
+        Todo.objects.subtree(old_path).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+            depth=F("depth") + delta,
+        )
+        self.parent, self.path, self.depth = parent, new_path, self.depth + delta
+
     def clean(self):
         super().clean()
         if self.due_date < datetime.date.today():
-            raise ValidationError({'due_date': "Due date cannot be in the past."})
-        
+            raise ValidationError({"due_date": "Due date cannot be in the past."})
+
     def __str__(self):
         return self.title
 
 
+def add_months(date, months):
+    # Same day in a later month, clamped to the last day of short months
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
+class Recurrence(models.Model):
+    """
+    Repeat rule of a template To-Do.
+
+    Occurrences are not stored: they are computed for the requested date
+    window, starting at the due date of the template. An occurrence becomes
+    a real To-Do (linked through ``Todo.series``) once it is edited, and a
+    ``SkippedOccurrence`` once it is deleted.
+    """
+
+    FREQUENCY_CHOICES = [
+        ("DAILY", "Daily"),
+        ("WEEKLY", "Weekly"),
+        ("MONTHLY", "Monthly"),
+    ]
+    todo = models.OneToOneField(
+        Todo, on_delete=models.CASCADE, related_name="recurrence"
+    )
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveIntegerField(default=1)
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+
+    def nth(self, start, n):
+        # Date of the n-th occurrence (0-based) of a series starting at start
+        if self.frequency == "MONTHLY":
+            return add_months(start, n * self.interval)
+        days = 7 if self.frequency == "WEEKLY" else 1
+        return start + datetime.timedelta(days=n * self.interval * days)
+
+    def dates(self, start, window_start, window_end):
+        # Occurrence dates inside [window_start, window_end]
+        if self.frequency == "MONTHLY":
+            months = (window_start.year - start.year) * 12
+            months += window_start.month - start.month
+            n = max(months // self.interval - 1, 0)
+        else:
+            days = 7 if self.frequency == "WEEKLY" else 1
+            n = max((window_start - start).days // (self.interval * days), 0)
+        while self.count is None or n < self.count:
+            date = self.nth(start, n)
+            if date > window_end or (self.until and date > self.until):
+                break
+            if date >= window_start:
+                yield date
+            n += 1
+
+    def __str__(self):
+        return f"{self.frequency} every {self.interval} ({self.todo})"
+
+
+class SkippedOccurrence(models.Model):
+    # Deleted occurrence of a recurring series, no longer listed
+    series = models.ForeignKey(
+        Todo, on_delete=models.CASCADE, related_name="skipped_occurrences"
+    )
+    occurrence_date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["series", "occurrence_date"],
+                name="skipped_occurrence_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.series_id} skipped on {self.occurrence_date}"
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     # todo field removed to avoid circular reference
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
+
     def __str__(self):
         return self.name
+
+
+class SharedVersion(models.Model):
+    # Version counters of the per-process caches, see todoApp/versions.py
+    name = models.CharField(max_length=100, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
+class TodoEvent(models.Model):
+    # Change events relayed between processes, see todoApp/events.py
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.data.get('type')} #{self.id}"
+
+
+class ImportCheckpoint(models.Model):
+    # Progress of an import_todos run, saved in the transaction of each chunk
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveBigIntegerField(default=0)
+    imported = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveBigIntegerField(default=0)
+    # Size of the rejects file when the chunk committed
+    rejects_size = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("SUCCEEDED", "Succeeded"),
+        ("FAILED", "Failed"),
+        ("CANCELLED", "Cancelled"),
+    ]
+    KIND_CHOICES = [
+        ("export", "Export"),
+        ("bulk_delete", "Bulk delete"),
+        ("bulk_status", "Bulk status change"),
+    ]
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="jobs"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="QUEUED")
+    cancel_requested = models.BooleanField(default=False)
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="job_status_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id}"
@@ -0,0 +1,217 @@
+"""
+Optional per-process snapshot of the To-Do table for filtered list queries.
+
+When ``TODO_SNAPSHOT_ENABLED`` is set, the stored To-Dos (no recurrence
+templates) of an owner are held in compact array columns: ids, status codes,
+due dates as ordinals, and the tag ids of every row in a CSR layout
+(``tag_ids[tag_offsets[i]:tag_offsets[i + 1]]`` are the tags of row ``i``).
+Rows are in creation order, the default list order. Filtering, sorting and
+paging then only touch these arrays, and the database is asked for the rows
+of one page by id.
+
+Writes bump a shared version per owner (see ``versions``) in their own
+transaction, so a write only makes the columns of its owner stale. Columns
+that are missing, stale or older than ``MAX_AGE`` are rebuilt from that
+owner's rows by a background thread, at most once per ``REBUILD_INTERVAL``;
+meanwhile, requests fall back to the database. The columns of the least
+recently used owners are dropped once more than ``MAX_ROWS`` rows are held.
+Writes that bypass the views must call ``todos_changed()``.
+"""
+
+import logging
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import Todo
+from .versions import bump_versions, get_version
+
+logger = logging.getLogger(__name__)
+
+OWNER_VERSION_NAME = "todos:owner:{}"
+
+# Seconds between two rebuilds of an owner, writes in between are served by
+# the database
+REBUILD_INTERVAL = 1.0
+
+# Seconds after which columns are rebuilt whatever the version says
+MAX_AGE = 300.0
+
+# Rows held by the snapshot of one process
+MAX_ROWS = 5_000_000
+
+STATUS_CODES = {value: code for code, (value, _) in enumerate(Todo.STATUS_CHOICES)}
+
+
+def todos_changed(owner_ids):
+    # Mark the columns of these owners stale, in the transaction of the write
+    # so readers see both or neither
+    if getattr(settings, "TODO_SNAPSHOT_ENABLED", False):
+        bump_versions(
+            [OWNER_VERSION_NAME.format(owner_id) for owner_id in set(owner_ids)]
+        )
+
+
+class Columns:
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.ids = array("q")
+        self.status = array("b")
+        self.due = array("l")  # date ordinals, 0 without due date
+        self.tag_offsets = array("l", [0])
+        self.tag_ids = array("q")
+
+    @classmethod
+    def build(cls, owner_id, version):
+        columns = cls(version)
+        rows = (
+            Todo.objects.filter(owner_id=owner_id)
+            .concrete()
+            .order_by("created_at", "id")
+            .values_list("id", "status", "due_date")
+        )
+        row_of = {}
+        for i, (todo_id, status, due_date) in enumerate(rows.iterator()):
+            row_of[todo_id] = i
+            columns.ids.append(todo_id)
+            columns.status.append(STATUS_CODES[status])
+            columns.due.append(due_date.toordinal() if due_date else 0)
+
+        # Counting sort of the links into rows, two passes over the arrays
+        link_rows = array("l")
+        link_tags = array("q")
+        links = Todo.tags.through.objects.filter(todo__owner_id=owner_id)
+        for todo_id, tag_id in links.values_list("todo_id", "tag_id").iterator():
+            i = row_of.get(todo_id)
+            if i is not None:
+                link_rows.append(i)
+                link_tags.append(tag_id)
+        offsets = array("l", [0]) * (len(columns.ids) + 1)
+        for i in link_rows:
+            offsets[i + 1] += 1
+        for i in range(len(columns.ids)):
+            offsets[i + 1] += offsets[i]
+        tag_ids = array("q", [0]) * len(link_rows)
+        fill = offsets[:-1]
+        for i, tag_id in zip(link_rows, link_tags):
+            tag_ids[fill[i]] = tag_id
+            fill[i] += 1
+        columns.tag_offsets, columns.tag_ids = offsets, tag_ids
+        return columns
+
+    def select(
+        self,
+        status=None,
+        tag_id=None,
+        due_before=None,
+        order="created_at",
+        offset=0,
+        limit=None,
+    ):
+        # Returns (ids of the page, number of matching rows)
+        rows = range(len(self.ids))
+        if status is not None:
+            code = STATUS_CODES[status]
+            rows = [i for i in rows if self.status[i] == code]
+        if due_before is not None:
+            before = due_before.toordinal()
+            rows = [i for i in rows if 0 < self.due[i] < before]
+        if tag_id is not None:
+            offsets, tag_ids = self.tag_offsets, self.tag_ids
+            rows = [i for i in rows if tag_id in tag_ids[offsets[i] : offsets[i + 1]]]
+        if order == "due_date":
+            # No due date last, ties in creation order like the database
+            due = self.due
+            rows = sorted(rows, key=lambda i: (due[i] == 0, due[i], i))
+        stop = None if limit is None else offset + limit
+        return [self.ids[i] for i in rows[offset:stop]], len(rows)
+
+
+class TodoSnapshot:
+    def __init__(self, max_rows=MAX_ROWS):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._owners = OrderedDict()  # owner id -> Columns
+        self._size = 0
+        self._pending = set()  # owner ids waiting for a rebuild
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def columns(self, owner_id):
+        # Up to date columns of the owner, or None when the caller should use
+        # the database
+        if not getattr(settings, "TODO_SNAPSHOT_ENABLED", False):
+            return None
+        version = get_version(OWNER_VERSION_NAME.format(owner_id))
+        now = time.monotonic()
+        with self._lock:
+            columns = self._owners.get(owner_id)
+            if columns is not None:
+                self._owners.move_to_end(owner_id)
+        if columns is not None:
+            if columns.version == version and now - columns.built_at < MAX_AGE:
+                return columns
+            if now - columns.built_at < REBUILD_INTERVAL:
+                return None
+        self.schedule(owner_id)
+        return None
+
+    def schedule(self, owner_id):
+        # Rebuild the owner's columns on the background thread
+        with self._lock:
+            if owner_id in self._pending:
+                return
+            self._pending.add(owner_id)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="todo-snapshot", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(owner_id)
+
+    def _run(self):
+        while True:
+            owner_id = self._queue.get()
+            try:
+                self.rebuild(owner_id)
+            except DatabaseError:
+                logger.exception("Could not rebuild the To-Do snapshot")
+                close_old_connections()
+            finally:
+                with self._lock:
+                    self._pending.discard(owner_id)
+
+    def rebuild(self, owner_id):
+        # Read before the scan, later writes make this version stale
+        version = get_version(OWNER_VERSION_NAME.format(owner_id))
+        columns = Columns.build(owner_id, version)
+        with self._lock:
+            self._discard(owner_id)
+            if len(columns.ids) <= self.max_rows:
+                self._owners[owner_id] = columns
+                self._size += len(columns.ids)
+                while self._size > self.max_rows:
+                    self._discard(next(iter(self._owners)))
+        return columns
+
+    def invalidate(self, owner_id=None):
+        with self._lock:
+            if owner_id is None:
+                self._owners.clear()
+                self._size = 0
+            else:
+                self._discard(owner_id)
+
+    def _discard(self, owner_id):
+        columns = self._owners.pop(owner_id, None)
+        if columns is not None:
+            self._size -= len(columns.ids)
+
+
+snapshot = TodoSnapshot()
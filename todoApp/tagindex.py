@@ -0,0 +1,167 @@
+"""
+Per-process prefix index over tag names used by the autocomplete endpoint.
+
+Suggestions only cover the tags on the requesting user's todos, so the
+index keeps one entry per owner: the sorted names of their tags with usage
+counts. An entry is loaded on first use from that owner's links alone and
+dropped by the least recently used order when too many owners are cached.
+
+Link changes bump a shared version per owner (see ``versions``), renaming or
+deleting a tag and bulk writes bump the version of all tags. An entry is
+checked against both every ``CHECK_INTERVAL`` seconds and reloaded when
+another process changed them, or when it is older than ``MAX_AGE``.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Tag, Todo
+from .versions import bump_version, bump_versions, get_versions
+
+VERSION_NAME = "tags"
+OWNER_VERSION_NAME = "tags:owner:{}"
+
+# Seconds between two checks of the shared versions
+CHECK_INTERVAL = 1.0
+
+# Seconds after which an entry is reloaded whatever the versions say
+MAX_AGE = 300.0
+
+# Owners whose tags are kept in memory
+MAX_OWNERS = 1000
+
+
+class OwnerTags:
+    def __init__(self, version, rows):
+        self.version = version
+        self.keys = sorted((name.casefold(), tag_id) for tag_id, name, _ in rows)
+        self.names = {tag_id: name for tag_id, name, _ in rows}
+        self.usage = {tag_id: usage for tag_id, _, usage in rows}
+        self.loaded_at = self.checked_at = time.monotonic()
+
+
+class TagPrefixIndex:
+    def __init__(self, max_owners=MAX_OWNERS):
+        self.max_owners = max_owners
+        self._lock = threading.Lock()
+        self._owners = OrderedDict()  # owner id -> OwnerTags
+
+    def _entry(self, owner_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._owners.get(owner_id)
+            if entry is not None:
+                self._owners.move_to_end(owner_id)
+        if (
+            entry is not None
+            and now - entry.checked_at < CHECK_INTERVAL
+            and now - entry.loaded_at < MAX_AGE
+        ):
+            return entry
+        names = [VERSION_NAME, OWNER_VERSION_NAME.format(owner_id)]
+        version = tuple(get_versions(names).values())
+        if (
+            entry is not None
+            and entry.version == version
+            and now - entry.loaded_at < MAX_AGE
+        ):
+            entry.checked_at = now
+            return entry
+        return self.load(owner_id, version)
+
+    def load(self, owner_id, version):
+        rows = list(
+            Todo.tags.through.objects.filter(todo__owner_id=owner_id)
+            .order_by()
+            .values("tag_id", "tag__name")
+            .annotate(usage=Count("id"))
+            .values_list("tag_id", "tag__name", "usage")
+        )
+        entry = OwnerTags(version, rows)
+        with self._lock:
+            self._owners[owner_id] = entry
+            self._owners.move_to_end(owner_id)
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+        return entry
+
+    def suggest(self, owner_id, prefix, limit=10):
+        # Return the `limit` most used tags of the owner starting with `prefix`
+        entry = self._entry(owner_id)
+        prefix = prefix.casefold()
+        lo = bisect_left(entry.keys, (prefix,))
+        hi = bisect_left(entry.keys, (prefix + "\U0010ffff",), lo)
+        best = heapq.nsmallest(
+            limit,
+            entry.keys[lo:hi],
+            key=lambda key: (-entry.usage[key[1]], key[0]),
+        )
+        return [
+            {"id": tag_id, "name": entry.names[tag_id], "usage": entry.usage[tag_id]}
+            for _, tag_id in best
+        ]
+
+    def usage(self, owner_id, tag_ids):
+        # Number of the owner's todos per tag id
+        usage = self._entry(owner_id).usage
+        return {tag_id: usage.get(tag_id, 0) for tag_id in tag_ids}
+
+    def owners_changed(self, owner_ids):
+        # The links of these owners changed, called after the commit
+        bump_versions([OWNER_VERSION_NAME.format(owner_id) for owner_id in owner_ids])
+        with self._lock:
+            for owner_id in owner_ids:
+                self._owners.pop(owner_id, None)
+
+    def invalidate(self):
+        # Reload every owner in every process, used after bulk writes
+        bump_version(VERSION_NAME)
+        with self._lock:
+            self._owners.clear()
+
+
+tag_index = TagPrefixIndex()
+
+
+def owner_tags_changed(owner_ids):
+    # For writes that drop links without sending m2m_changed, like deletes
+    owner_ids = set(owner_ids)
+    transaction.on_commit(lambda: tag_index.owners_changed(owner_ids))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    # A new tag is on nobody's todos yet
+    if not created:
+        transaction.on_commit(tag_index.invalidate)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    transaction.on_commit(tag_index.invalidate)
+
+
+@receiver(m2m_changed, sender=Todo.tags.through)
+def todo_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        todos = Todo.objects.filter(tags=instance)
+    elif action in ("post_add", "post_remove", "pre_clear") and not reverse:
+        if action != "pre_clear" and not pk_set:
+            return
+        if instance.owner_id is not None:
+            owner_tags_changed([instance.owner_id])
+            return
+        todos = Todo.objects.filter(id=instance.id)
+    elif action in ("post_add", "post_remove") and pk_set:
+        todos = Todo.objects.filter(id__in=pk_set)
+    else:
+        return
+    owner_tags_changed(todos.values_list("owner_id", flat=True).distinct())
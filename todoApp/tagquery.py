@@ -0,0 +1,344 @@
+"""
+Boolean tag queries such as ``work AND (urgent OR home) AND NOT later``.
+
+For every (owner, tag) pair a sorted array of todo ids, its posting list,
+is loaded on first use and kept in a bounded per-process LRU. A query only
+combines these arrays: AND operands are evaluated from the rarest tag on
+(by the usage counts of the tag index) and stop as soon as the running
+intersection is empty, and NOT is turned into a difference so the owner's
+full list of ids is only read for queries that are negative as a whole.
+
+Adding or removing links bumps a shared version per (owner, tag) pair (see
+``versions``) in the same transaction, which makes every process reload
+that array while the other owners' arrays of the same tag stay cached; bulk
+writes that send no signals bump the version of all tags
+instead, which drops them all. Deleting todos drops their links without a
+signal too, so the delete paths call ``todos_deleting()`` first. Arrays
+older than ``MAX_AGE`` are reloaded whatever the versions say.
+"""
+
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from math import inf
+
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Tag, Todo
+from .tagindex import VERSION_NAME, tag_index
+from .versions import bump_versions, get_versions
+
+POSTINGS_VERSION_NAME = "postings:{}:{}"
+
+# Seconds after which an array is reloaded
+MAX_AGE = 300.0
+
+# Upper bound of the ids held by the cache of one process (8 bytes each)
+MAX_CACHED_IDS = 2_000_000
+
+MAX_TAGS = 20
+
+OPERATORS = ("AND", "OR", "NOT")
+TOKEN_RE = re.compile(r'\s*(?:([()])|"([^"]*)"|([^\s()"]+))')
+
+
+def _tokenize(text):
+    tokens = []
+    text = text.strip()
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise ValueError("Tag query has an unterminated quote!")
+        paren, quoted, word = match.groups()
+        if paren:
+            tokens.append(paren)
+        elif quoted is not None:
+            tokens.append(("tag", quoted.strip()))
+        elif word in OPERATORS:
+            tokens.append(word)
+        else:
+            tokens.append(("tag", word))
+        pos = match.end()
+    return tokens
+
+
+def parse_tag_query(text):
+    # Returns the expression tree: ("tag", name), ("not", node), or
+    # ("and" | "or", [nodes]). NOT binds tighter than AND, AND than OR.
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ValueError("Tag query is a required parameter!")
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise ValueError("Tag query ended unexpectedly!")
+        pos += 1
+        return token
+
+    def expression():
+        nodes = [term()]
+        while peek() == "OR":
+            take()
+            nodes.append(term())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def term():
+        nodes = [factor()]
+        while peek() == "AND":
+            take()
+            nodes.append(factor())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def factor():
+        token = take()
+        if token == "NOT":
+            return ("not", factor())
+        if token == "(":
+            node = expression()
+            if take() != ")":
+                raise ValueError("Tag query has an unclosed parenthesis!")
+            return node
+        if isinstance(token, tuple) and token[1]:
+            return token
+        raise ValueError(f"Tag query has an unexpected '{token}'!")
+
+    tree = expression()
+    if peek() is not None:
+        raise ValueError(f"Tag query has an unexpected '{peek()}'!")
+    if len(tag_names(tree)) > MAX_TAGS:
+        raise ValueError(f"Tag query can use at most {MAX_TAGS} tags!")
+    return tree
+
+
+def tag_names(node):
+    if node[0] == "tag":
+        return {node[1]}
+    if node[0] == "not":
+        return tag_names(node[1])
+    return set().union(*(tag_names(child) for child in node[1]))
+
+
+def _intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) * len(b).bit_length() < len(b):
+        # Few ids against a long list, binary search each of them
+        result = array("q")
+        lo = 0
+        for todo_id in a:
+            lo = bisect_left(b, todo_id, lo)
+            if lo == len(b):
+                break
+            if b[lo] == todo_id:
+                result.append(todo_id)
+        return result
+    members = set(a)
+    return array("q", (todo_id for todo_id in b if todo_id in members))
+
+
+def _union(a, b):
+    return array("q", sorted(set(a).union(b)))
+
+
+def _difference(a, b):
+    members = set(b)
+    return array("q", (todo_id for todo_id in a if todo_id not in members))
+
+
+def bump_posting_versions(pairs):
+    # pairs of (owner id, tag id)
+    bump_versions([POSTINGS_VERSION_NAME.format(*pair) for pair in set(pairs)])
+
+
+def _link_owners(links):
+    # (owner id, tag id) pairs of these links
+    return links.values_list("todo__owner_id", "tag_id").distinct()
+
+
+def todos_deleting(todos):
+    # Deleting todos drops their links without m2m_changed, call this first
+    # in the same transaction
+    bump_posting_versions(
+        _link_owners(Todo.tags.through.objects.filter(todo__in=todos))
+    )
+
+
+class PostingCache:
+    def __init__(self, max_ids=MAX_CACHED_IDS):
+        self.max_ids = max_ids
+        self._lock = threading.Lock()
+        # (owner id, tag id) -> (version, load time, ids)
+        self._lists = OrderedDict()
+        self._size = 0
+        self._tags_version = None
+
+    def versions(self, owner_id, tag_ids):
+        # Current version of the owner's array per tag id, in the same query
+        # as the version of all tags; when that one changed everything cached
+        # is dropped
+        names = {
+            POSTINGS_VERSION_NAME.format(owner_id, tag_id): tag_id for tag_id in tag_ids
+        }
+        versions = get_versions([VERSION_NAME, *names])
+        with self._lock:
+            if versions[VERSION_NAME] != self._tags_version:
+                self._clear()
+                self._tags_version = versions[VERSION_NAME]
+        return {tag_id: versions[name] for name, tag_id in names.items()}
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def get(self, owner_id, tag_id, version):
+        key = (owner_id, tag_id)
+        with self._lock:
+            entry = self._lists.get(key)
+            if (
+                entry is not None
+                and entry[0] == version
+                and time.monotonic() - entry[1] < MAX_AGE
+            ):
+                self._lists.move_to_end(key)
+                return entry[2]
+        loaded_at = time.monotonic()
+        ids = array(
+            "q",
+            Todo.tags.through.objects.filter(tag_id=tag_id, todo__owner_id=owner_id)
+            .order_by("todo_id")
+            .values_list("todo_id", flat=True)
+            .iterator(),
+        )
+        with self._lock:
+            self._discard(key)
+            if len(ids) <= self.max_ids:
+                self._lists[key] = (version, loaded_at, ids)
+                self._size += len(ids)
+                while self._size > self.max_ids:
+                    self._discard(next(iter(self._lists)))
+        return ids
+
+    def _clear(self):
+        self._lists.clear()
+        self._size = 0
+
+    def _discard(self, key):
+        entry = self._lists.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[2])
+
+
+postings = PostingCache()
+
+
+class _Evaluation:
+    def __init__(self, owner_id, tree):
+        self.owner_id = owner_id
+        names = tag_names(tree)
+        self.tag_ids = dict(
+            Tag.objects.filter(name__in=names).values_list("name", "id")
+        )
+        self.usage = tag_index.usage(owner_id, self.tag_ids.values())
+        self.versions = postings.versions(owner_id, self.tag_ids.values())
+
+    def cost(self, node):
+        # Estimated number of ids, negations go last as differences
+        kind = node[0]
+        if kind == "tag":
+            tag_id = self.tag_ids.get(node[1])
+            return self.usage.get(tag_id, 0) if tag_id else 0
+        if kind == "not":
+            return inf
+        costs = [self.cost(child) for child in node[1]]
+        return min(costs) if kind == "and" else sum(costs)
+
+    def evaluate(self, node):
+        # Returns (ids, negated), negated meaning every todo except ids
+        kind = node[0]
+        if kind == "tag":
+            tag_id = self.tag_ids.get(node[1])
+            if tag_id is None:
+                return array("q"), False
+            return postings.get(self.owner_id, tag_id, self.versions[tag_id]), False
+        if kind == "not":
+            ids, negated = self.evaluate(node[1])
+            return ids, not negated
+        if kind == "and":
+            result = None
+            for child in sorted(node[1], key=self.cost):
+                value = self.evaluate(child)
+                result = value if result is None else _and(result, value)
+                if not result[0] and not result[1]:
+                    break
+            return result
+        result = None
+        for child in node[1]:
+            value = self.evaluate(child)
+            result = value if result is None else _or(result, value)
+            if not result[0] and result[1]:
+                break
+        return result
+
+
+def _and(left, right):
+    (a, a_negated), (b, b_negated) = left, right
+    if not a_negated and not b_negated:
+        return _intersect(a, b), False
+    if not a_negated:
+        return _difference(a, b), False
+    if not b_negated:
+        return _difference(b, a), False
+    return _union(a, b), True
+
+
+def _or(left, right):
+    (a, a_negated), (b, b_negated) = left, right
+    if not a_negated and not b_negated:
+        return _union(a, b), False
+    if not a_negated:
+        return _difference(b, a), True
+    if not b_negated:
+        return _difference(a, b), True
+    return _intersect(a, b), True
+
+
+def tag_query(owner_id, tree):
+    # Sorted ids of the owner's todos matching the expression tree
+    ids, negated = _Evaluation(owner_id, tree).evaluate(tree)
+    if negated:
+        everything = (
+            Todo.objects.filter(owner_id=owner_id)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        ids = _difference(everything.iterator(), ids)
+    return ids
+
+
+@receiver(m2m_changed, sender=Todo.tags.through)
+def todo_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        pairs = _link_owners(sender.objects.filter(tag_id=instance.id))
+    elif action in ("post_add", "post_remove") and reverse and pk_set:
+        owners = Todo.objects.filter(id__in=pk_set).values_list("owner_id", flat=True)
+        pairs = [(owner_id, instance.id) for owner_id in owners.distinct()]
+    elif action == "pre_clear":
+        tag_ids = instance.tags.values_list("id", flat=True)
+        pairs = [(instance.owner_id, tag_id) for tag_id in tag_ids]
+    elif action in ("post_add", "post_remove") and pk_set:
+        pairs = [(instance.owner_id, tag_id) for tag_id in pk_set]
+    else:
+        return
+    # In the transaction of the change, readers see both or neither
+    bump_posting_versions(pairs)
@@ -1,11 +1,44 @@
 from django.urls import path
-from .views import addtodo, updatetodo, deletetodo, showtodos, showtodo
-
+from .views import (
+    addtodo,
+    updatetodo,
+    updateoccurrence,
+    deletetodo,
+    movetodo,
+    showsubtree,
+    showprogress,
+    showtodos,
+    showtodo,
+    duesoon,
+    tagautocomplete,
+    tagquery,
+    todoevents,
+    submitjob,
+    showjob,
+    canceljob,
+    downloadjob,
+)
 
 urlpatterns = [
     path("", showtodos, name="showtodos"),
     path("addtodo", addtodo, name="addtodo"),
     path("updatetodo/<int:id>", updatetodo, name="updatetodo"),
+    path(
+        "updatetodo/<int:id>/occurrences/<str:date>",
+        updateoccurrence,
+        name="updateoccurrence",
+    ),
     path("deletetodo/<int:id>", deletetodo, name="deletetodo"),
+    path("movetodo/<int:id>", movetodo, name="movetodo"),
+    path("<int:id>/subtree", showsubtree, name="showsubtree"),
+    path("<int:id>/progress", showprogress, name="showprogress"),
+    path("duesoon", duesoon, name="duesoon"),
+    path("tags/autocomplete", tagautocomplete, name="tagautocomplete"),
+    path("tags/query", tagquery, name="tagquery"),
+    path("events", todoevents, name="todoevents"),
+    path("jobs", submitjob, name="submitjob"),
+    path("jobs/<int:id>", showjob, name="showjob"),
+    path("jobs/<int:id>/cancel", canceljob, name="canceljob"),
+    path("jobs/<int:id>/download", downloadjob, name="downloadjob"),
     path("<int:id>", showtodo, name="showtodo"),
 ]
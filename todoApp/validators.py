@@ -0,0 +1,162 @@
+import datetime
+
+from .models import Recurrence, Todo
+
+STATUS_VALUES = [value for value, _ in Todo.STATUS_CHOICES]
+
+STATUS_ERROR = "Status should be one of the following: 'OPEN', 'WORKING', 'COMPLETED', 'PENDING REVIEW', 'OVERDUE', 'CANCELLED'"
+RECURRENCE_DUE_DATE_ERROR = "Recurring To-Do items need a due date to start from!"
+LENGTH_ERROR = "Title should be less than 100 characters and Description should be less than 1000 characters!"
+
+
+def parse_due_date(value):
+    # Accepts a date, an ISO formatted string or an empty value
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError("Due date should be in YYYY-MM-DD format!")
+
+
+def clean_tag_names(tags):
+    # Strip tag names, drop empty ones and keep the first occurrence only
+    if not isinstance(tags, (list, tuple)):
+        raise ValueError("Tags should be a list of names!")
+    names = []
+    for tag_name in tags:
+        if not isinstance(tag_name, str):
+            raise ValueError("Tags should be a list of names!")
+        tag_name = tag_name.strip()
+        if not tag_name or tag_name in names:
+            continue
+        if len(tag_name) > 50:
+            raise ValueError("Tag names should be less than 50 characters!")
+        names.append(tag_name)
+    return names
+
+
+def validate_new_todo(data):
+    """
+    Validate the payload of a new To-Do item.
+
+    Returns a ``(cleaned, error)`` pair: ``cleaned`` holds the normalised
+    fields when the payload is valid, otherwise ``error`` holds the message
+    returned to the client.
+    """
+    title = data.get("title")
+    description = data.get("description")
+    status = data.get("status", "OPEN")  # Default status
+
+    # check due_date is not in past
+    try:
+        due_date = parse_due_date(data.get("due_date"))
+    except ValueError as e:
+        return None, str(e)
+    if due_date and due_date < datetime.date.today():
+        return None, "Due date cannot be in the past!"
+
+    # Validate required fields
+    if not title or not description:
+        return None, "Title and Description are required fields!"
+
+    if not isinstance(title, str) or not isinstance(description, str):
+        return None, "Title and Description should be text!"
+
+    if len(title) > 100 or len(description) > 1000:
+        return None, LENGTH_ERROR
+
+    # validate if status is in list of choices or not
+    if status not in STATUS_VALUES:
+        return None, STATUS_ERROR
+
+    try:
+        tags = clean_tag_names(data.get("tags") or [])
+    except ValueError as e:
+        return None, str(e)
+
+    cleaned = {
+        "title": title,
+        "description": description,
+        "due_date": due_date,
+        "status": status,
+        "tags": tags,
+    }
+    return cleaned, None
+
+
+def validate_todo_changes(data):
+    """
+    Validate a partial update of a To-Do item.
+
+    Only the fields present in ``data`` are checked. Returns a
+    ``(changes, tags, error)`` triple where ``changes`` maps column names to
+    their new values and ``tags`` is ``None`` when tags were not sent.
+    """
+    changes = {}
+    for field, max_length in (("title", 100), ("description", 1000)):
+        if field in data:
+            value = data[field]
+            if not value or not isinstance(value, str):
+                return None, None, "Title and Description are required fields!"
+            if len(value) > max_length:
+                return None, None, LENGTH_ERROR
+            changes[field] = value
+
+    if "due_date" in data:
+        try:
+            due_date = parse_due_date(data["due_date"])
+        except ValueError as e:
+            return None, None, str(e)
+        if due_date and due_date < datetime.date.today():
+            return None, None, "Due date cannot be in the past!"
+        changes["due_date"] = due_date
+
+    if "status" in data:
+        if data["status"] not in STATUS_VALUES:
+            return None, None, STATUS_ERROR
+        changes["status"] = data["status"]
+
+    tags = None
+    if "tags" in data:
+        try:
+            tags = clean_tag_names(data["tags"] or [])
+        except ValueError as e:
+            return None, None, str(e)
+
+    return changes, tags, None
+
+
+def validate_recurrence(value, due_date):
+    # Returns (fields of the Recurrence, error)
+    if not isinstance(value, dict):
+        return None, "Recurrence should be an object!"
+    if not due_date:
+        return None, RECURRENCE_DUE_DATE_ERROR
+    frequencies = [choice for choice, _ in Recurrence.FREQUENCY_CHOICES]
+    if value.get("frequency") not in frequencies:
+        return None, "Frequency should be one of the following: " + ", ".join(
+            f"'{choice}'" for choice in frequencies
+        )
+    interval = value.get("interval", 1)
+    count = value.get("count")
+    for number in (interval, count):
+        if number is not None and (
+            not isinstance(number, int) or isinstance(number, bool) or number < 1
+        ):
+            return None, "Interval and count should be positive numbers!"
+    try:
+        until = parse_due_date(value.get("until"))
+    except ValueError as e:
+        return None, str(e)
+    if until and until < due_date:
+        return None, "Recurrence cannot end before its first occurrence!"
+    fields = {
+        "frequency": value["frequency"],
+        "interval": interval,
+        "until": until,
+        "count": count,
+    }
+    return fields, None
@@ -0,0 +1,50 @@
+"""
+Version counters shared by all processes, stored in the database.
+
+The per-process caches (tag index, tag posting lists, todo snapshot) compare
+the version they were built from with the current one to notice writes made
+by other processes. Keeping the counters in a table instead of the Django
+cache makes that work with every cache backend, including the default
+per-process ``LocMemCache``, and a bump made inside a transaction only
+becomes visible together with the data it describes.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import SharedVersion
+
+
+def get_versions(names):
+    # {name: value}, counters that were never bumped are 0
+    found = dict(
+        SharedVersion.objects.filter(name__in=names).values_list("name", "value")
+    )
+    return {name: found.get(name, 0) for name in names}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_versions(names):
+    names = list(names)
+    if not names:
+        return
+    with transaction.atomic():
+        versions = SharedVersion.objects.filter(name__in=names)
+        if versions.update(value=F("value") + 1) < len(names):
+            existing = set(versions.values_list("name", flat=True))
+            missing = [name for name in names if name not in existing]
+            # Another process may create them meanwhile, bump either way
+            SharedVersion.objects.bulk_create(
+                [SharedVersion(name=name) for name in missing], ignore_conflicts=True
+            )
+            SharedVersion.objects.filter(name__in=missing).update(value=F("value") + 1)
+
+
+def bump_version(name):
+    # Returns the new value
+    with transaction.atomic():
+        bump_versions([name])
+        return get_version(name)
@@ -1,16 +1,57 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from rest_framework import status as st
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import (
     permission_classes,
     authentication_classes,
     api_view,
 )
 from django.shortcuts import get_object_or_404
-from .models import Todo, Tag
-import json
+from django.utils import timezone
+from .events import hub, publish_todo_event
+from .jobs import validate_params
+from .models import MAX_DEPTH, Job, Recurrence, SkippedOccurrence, Todo, Tag
+from .snapshot import snapshot, todos_changed
+from .tagindex import owner_tags_changed, tag_index
+from .tagquery import parse_tag_query, tag_query, todos_deleting
+from .validators import (
+    RECURRENCE_DUE_DATE_ERROR,
+    STATUS_ERROR,
+    STATUS_VALUES,
+    parse_due_date,
+    validate_new_todo,
+    validate_recurrence,
+    validate_todo_changes,
+)
 import datetime
+import heapq
+import json
+import os
+
+# Occurrences of recurring To-Dos listed when no date window is given
+OCCURRENCE_WINDOW = datetime.timedelta(days=30)
+MAX_OCCURRENCE_WINDOW = datetime.timedelta(days=366)
+
+# Query parameters turning the list into a filtered, paged list of stored
+# To-Dos (without recurring occurrences)
+LIST_FILTERS = ("status", "tag", "due_before", "order", "limit", "offset")
+MAX_PAGE_SIZE = 1000
+
+# Ids per query when fetching rows by id, below SQLite's variable limit
+ROWS_BATCH = 500
 
 
 # Add To-Do
@@ -22,72 +63,55 @@ def addtodo(request):
         try:
             # Parse JSON data
             data = json.loads(request.body)
-            title = data.get("title")
-            description = data.get("description")
-            due_date = data.get("due_date")
-            status = data.get("status", "OPEN")  # Default status
-            tags = data.get("tags", [])
-
-            # check due_date is not in past
-            if due_date:
-                if due_date < str(datetime.date.today()):
-                    return JsonResponse(
-                        {"error": "Due date cannot be in the past!"},
-                        status=st.HTTP_400_BAD_REQUEST,
-                    )
-
-            # Validate required fields
-            if not title or not description:
+            if not isinstance(data, dict):
                 return JsonResponse(
-                    {"error": "Title and Description are required fields!"},
-                    status=st.HTTP_400_BAD_REQUEST,
+                    {"error": "Invalid JSON format"}, status=st.HTTP_400_BAD_REQUEST
                 )
-
-            if len(title) > 100 or len(description) > 1000:
-                return JsonResponse(
-                    {
-                        "error": "Title should be less than 100 characters and Description should be less than 1000 characters!"
-                    },
-                    status=st.HTTP_400_BAD_REQUEST,
-                )
-
-            # validate if status is in list of choices or not
-            status_choices = [
-                "OPEN",
-                "WORKING",
-                "COMPLETED",
-                "PENDING REVIEW",
-                "OVERDUE",
-                "CANCELLED",
-            ]
-            if status not in status_choices or status == "":
-                return JsonResponse(
-                    {
-                        "error": "Status should be one of the following: 'OPEN', 'WORKING', 'COMPLETED', 'PENDING REVIEW', 'OVERDUE', 'CANCELLED'"
-                    },
-                    status=st.HTTP_400_BAD_REQUEST,
+            cleaned, error = validate_new_todo(data)
+            recurrence = None
+            if not error and data.get("recurrence") is not None:
+                recurrence, error = validate_recurrence(
+                    data["recurrence"], cleaned["due_date"]
                 )
+            parent = None
+            if not error and data.get("parent") is not None:
+                parent, error = _parent(request, data["parent"])
+            if error:
+                return JsonResponse({"error": error}, status=st.HTTP_400_BAD_REQUEST)
 
             # done with checks push in database
-            # Create new To-Do item
             # tags are many to many realtion so we need to pass list of tags
             # Process tags
-            tag_objects = []
-            for tag_name in tags:
-                tag_name = tag_name.strip()
-                if tag_name:
+            # The To-Do, its tags and its recurrence appear together or not at all
+            with transaction.atomic():
+                tag_objects = []
+                for tag_name in cleaned["tags"]:
                     # Create tag if it doesn't exist
                     tag, _ = Tag.objects.get_or_create(name=tag_name)
                     tag_objects.append(tag)
 
-            # Create the To-Do item
-            todo = Todo.objects.create(
-                title=title,
-                description=description,
-                due_date=due_date,
-                status=status,
-            )
-            todo.tags.set(tag_objects)
+                # Create the To-Do item
+                todo = Todo.objects.create(
+                    owner=request.user,
+                    parent=parent,
+                    title=cleaned["title"],
+                    description=cleaned["description"],
+                    due_date=cleaned["due_date"],
+                    status=cleaned["status"],
+                )
+                todo.tags.set(tag_objects)
+                if recurrence:
+                    Recurrence.objects.create(todo=todo, **recurrence)
+                publish_todo_event(
+                    "created",
+                    todo.id,
+                    request.user.id,
+                    title=todo.title,
+                    due_date=todo.due_date,
+                    status=todo.status,
+                    tags=cleaned["tags"],
+                )
+                todos_changed([request.user.id])
 
             return JsonResponse(
                 {"message": "To-Do item added successfully!", "id": todo.id},
@@ -99,8 +123,199 @@ def addtodo(request):
             )
 
     # Handle GET request to list all todos
-    todos = Todo.objects.all().values()
-    return JsonResponse(list(todos), safe=False, status=st.HTTP_200_OK)
+    return _list_todos(request)
+
+
+def _occurrences(templates, start, end):
+    # Rows for the occurrences of recurring templates inside [start, end]
+    # that were not turned into real To-Dos yet
+    templates = list(templates.select_related("recurrence"))
+    if not templates:
+        return []
+    materialized = set(
+        Todo.objects.filter(
+            series__in=templates, occurrence_date__range=(start, end)
+        ).values_list("series_id", "occurrence_date")
+    )
+    # Deleted occurrences stay deleted
+    materialized.update(
+        SkippedOccurrence.objects.filter(
+            series__in=templates, occurrence_date__range=(start, end)
+        ).values_list("series_id", "occurrence_date")
+    )
+    rows = []
+    for template in templates:
+        for date in template.recurrence.dates(template.due_date, start, end):
+            if (template.id, date) in materialized:
+                continue
+            rows.append(
+                {
+                    "id": None,
+                    "title": template.title,
+                    "description": template.description,
+                    "due_date": date,
+                    "status": "OPEN",
+                    "created_at": template.created_at,
+                    "owner_id": template.owner_id,
+                    "version": None,
+                    "series_id": template.id,
+                    "occurrence_date": date,
+                    "parent_id": None,
+                    "path": None,
+                    "depth": 0,
+                }
+            )
+    rows.sort(key=lambda row: (row["due_date"], row["series_id"]))
+    return rows
+
+
+def _date_window(request):
+    # Window of recurring occurrences to list, defaults to the next 30 days
+    try:
+        start = parse_due_date(request.GET.get("from")) or datetime.date.today()
+        end = parse_due_date(request.GET.get("to")) or start + OCCURRENCE_WINDOW
+    except ValueError:
+        raise ValueError("Dates should be in YYYY-MM-DD format!")
+    if end < start or end - start > MAX_OCCURRENCE_WINDOW:
+        raise ValueError("The date window should span at most 366 days!")
+    return start, end
+
+
+def _list_todos(request):
+    if any(name in request.GET for name in LIST_FILTERS):
+        return _filtered_todos(request)
+    try:
+        start, end = _date_window(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=st.HTTP_400_BAD_REQUEST)
+    todos = Todo.objects.filter(owner=request.user)
+    rows = list(todos.concrete().order_by("created_at", "id").values())
+    rows += _occurrences(todos.templates().actionable(), start, end)
+    return JsonResponse(rows, safe=False, status=st.HTTP_200_OK)
+
+
+def _list_params(request):
+    params = {
+        "status": request.GET.get("status"),
+        "due_before": parse_due_date(request.GET.get("due_before")),
+        "order": request.GET.get("order", "created_at"),
+    }
+    if params["status"] is not None and params["status"] not in STATUS_VALUES:
+        raise ValueError(STATUS_ERROR)
+    if params["order"] not in ("created_at", "due_date"):
+        raise ValueError("Order should be 'created_at' or 'due_date'!")
+    try:
+        limit = request.GET.get("limit")
+        params["limit"] = None if limit is None else int(limit)
+        params["offset"] = int(request.GET.get("offset", 0))
+    except ValueError:
+        params["limit"] = params["offset"] = -1
+    if (
+        params["limit"] is not None and not 1 <= params["limit"] <= MAX_PAGE_SIZE
+    ) or params["offset"] < 0:
+        raise ValueError(
+            f"Limit should be between 1 and {MAX_PAGE_SIZE} and offset not negative!"
+        )
+    return params
+
+
+def _filtered_todos(request):
+    try:
+        params = _list_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=st.HTTP_400_BAD_REQUEST)
+    tag_id = None
+    if "tag" in request.GET:
+        tag_id = Tag.objects.filter(name=request.GET["tag"]).values_list(
+            "id", flat=True
+        )
+        tag_id = tag_id.first() or 0
+
+    rows = None
+    columns = snapshot.columns(request.user.id)
+    if columns is not None:
+        ids, total = columns.select(tag_id=tag_id, **params)
+        rows = _rows_by_id(request, ids)
+        if rows is None:
+            # Written without bumping the version, do not trust it again
+            snapshot.invalidate(request.user.id)
+    if rows is None:
+        todos = Todo.objects.filter(owner=request.user).concrete()
+        if params["status"] is not None:
+            todos = todos.filter(status=params["status"])
+        if params["due_before"] is not None:
+            todos = todos.filter(due_date__lt=params["due_before"])
+        if tag_id is not None:
+            todos = todos.filter(tags=tag_id)
+        if params["order"] == "due_date":
+            todos = todos.order_by(
+                F("due_date").asc(nulls_last=True), "created_at", "id"
+            )
+        else:
+            todos = todos.order_by("created_at", "id")
+        total = todos.count()
+        offset, limit = params["offset"], params["limit"]
+        stop = None if limit is None else offset + limit
+        rows = list(todos[offset:stop].values())
+    return JsonResponse(
+        rows, safe=False, status=st.HTTP_200_OK, headers={"X-Total-Count": total}
+    )
+
+
+def _rows_by_id(request, ids):
+    # Rows in the order of ids, or None when some of them are gone
+    found = {}
+    for i in range(0, len(ids), ROWS_BATCH):
+        found.update(
+            (row["id"], row)
+            for row in Todo.objects.filter(
+                owner=request.user, id__in=ids[i : i + ROWS_BATCH]
+            ).values()
+        )
+    if len(found) < len(ids):
+        return None
+    return [found[todo_id] for todo_id in ids]
+
+
+def _parent(request, parent_id):
+    # Returns (parent To-Do, error) for a subtask of parent_id
+    if isinstance(parent_id, bool) or not isinstance(parent_id, int):
+        return None, "Parent should be the ID of a To-Do item!"
+    parent = Todo.objects.filter(id=parent_id, owner=request.user).first()
+    if parent is None:
+        return None, "Parent To-Do item does not exist!"
+    if parent.depth >= MAX_DEPTH:
+        return None, f"Subtasks cannot be nested more than {MAX_DEPTH} levels deep!"
+    return parent, None
+
+
+def _expected_version(request, data):
+    # Version the client based its changes on, from If-Match or the body
+    header = request.headers.get("If-Match")
+    if header is not None:
+        header = header.strip()
+        if header == "*":
+            return None
+        if header.startswith("W/"):
+            header = header[2:]
+        value = header.strip('"')
+    else:
+        value = data.get("version")
+        if value is None:
+            return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Version should be a number!")
+
+
+def _tag_ids(names):
+    # Resolve tag names to ids, creating the missing tags
+    ids = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+    for name in names:
+        if name not in ids:
+            ids[name] = Tag.objects.get_or_create(name=name)[0].id
+    return set(ids.values())
 
 
 # Update To-Do
@@ -108,92 +323,240 @@ def addtodo(request):
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
 def updatetodo(request, id):
-    try:
-        # Get the existing To-Do object
-        todo = get_object_or_404(Todo, id=id)
+    return _update_todo(request, id)
+
 
+def _update_todo(request, id):
+    try:
         # Parse JSON data
         data = json.loads(request.body)
-
-        # Update fields only if provided
-
-        # check for length of title and description
-        if len(data.get("description")) > 1000 or len(data.get("title")) > 100:
+        if not isinstance(data, dict):
             return JsonResponse(
-                {
-                    "error": "Title should be less than 100 characters and Description should be less than 1000 characters!"
-                },
-                status=st.HTTP_400_BAD_REQUEST,
+                {"error": "Invalid JSON format"}, status=st.HTTP_400_BAD_REQUEST
             )
-        todo.title = data.get("title", todo.title)
-        todo.description = data.get("description", todo.description)
 
-        # check for due date
-        if data.get("due_date") and data.get("due_date") < str(datetime.date.today()):
-            return JsonResponse(
-                {"error": "Due date cannot be in the past!"},
-                status=st.HTTP_400_BAD_REQUEST,
-            )
-        todo.due_date = data.get("due_date", todo.due_date)
-
-        # check for status
-        if (data.get("status") == "") or data.get("status") not in [
-            "OPEN",
-            "WORKING",
-            "COMPLETED",
-            "PENDING REVIEW",
-            "OVERDUE",
-            "CANCELLED",
-        ]:
-            return JsonResponse(
-                {
-                    "error": "Status should be one of the following: 'OPEN', 'WORKING', 'COMPLETED', 'PENDING REVIEW', 'OVERDUE', 'CANCELLED'"
-                },
-                status=st.HTTP_400_BAD_REQUEST,
-            )
-        todo.status = data.get("status", todo.status)
-
-        # check for tags
-        tag_objects = []
-        for tag_name in data.get('tags'):
-            tag_name = tag_name.strip()
-            if tag_name:
-                # Create tag if it doesn't exist
-                tag, _ = Tag.objects.get_or_create(name=tag_name)
-                tag_objects.append(tag)
-        todo.tags.set(tag_objects)
-        todo.save()
+        # Validate only the fields that were provided
+        changes, tags, error = validate_todo_changes(data)
+        if error is None:
+            try:
+                expected = _expected_version(request, data)
+            except ValueError as e:
+                error = str(e)
+        todos = Todo.objects.filter(id=id, owner=request.user)
+        if (
+            error is None
+            and "due_date" in changes
+            and changes["due_date"] is None
+            and todos.templates().exists()
+        ):
+            # The occurrences of a series are counted from its due date
+            error = RECURRENCE_DUE_DATE_ERROR
+        if error:
+            return JsonResponse({"error": error}, status=st.HTTP_400_BAD_REQUEST)
 
-        return JsonResponse(
-            {"message": f"To-Do item with ID {id} updated successfully!"},
-            status=st.HTTP_200_OK,
-        )
+        with transaction.atomic():
+            # Single conditional UPDATE of the provided columns, no SELECT
+            matched = todos if expected is None else todos.filter(version=expected)
+            if not matched.update(**changes, version=F("version") + 1):
+                current = todos.values_list("version", flat=True).first()
+                if current is None:
+                    raise Http404
+                return JsonResponse(
+                    {
+                        "error": "To-Do item was modified by someone else!",
+                        "version": current,
+                    },
+                    status=st.HTTP_412_PRECONDITION_FAILED,
+                    headers={"ETag": f'"{current}"'},
+                )
+
+            # Only touch the through table when the tags actually changed
+            if tags is not None:
+                wanted = _tag_ids(tags)
+                current_tags = set(
+                    Todo.tags.through.objects.filter(todo_id=id).values_list(
+                        "tag_id", flat=True
+                    )
+                )
+                todo = Todo(id=id, owner=request.user)
+                if current_tags - wanted:
+                    todo.tags.remove(*(current_tags - wanted))
+                if wanted - current_tags:
+                    todo.tags.add(*(wanted - current_tags))
+                changes["tags"] = tags
+
+            publish_todo_event("updated", id, request.user.id, **changes)
+            todos_changed([request.user.id])
+
+        response = {
+            "message": f"To-Do item with ID {id} updated successfully!",
+            "id": id,
+        }
+        headers = {}
+        if expected is not None:
+            response["version"] = expected + 1
+            headers["ETag"] = f'"{expected + 1}"'
+        return JsonResponse(response, status=st.HTTP_200_OK, headers=headers)
     except json.JSONDecodeError:
         return JsonResponse(
             {"error": "Invalid JSON format"}, status=st.HTTP_400_BAD_REQUEST
         )
 
 
+# Edit or complete one occurrence of a recurring To-Do
+@api_view(["PATCH"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def updateoccurrence(request, id, date):
+    template = get_object_or_404(
+        Todo.objects.templates().select_related("recurrence"),
+        id=id,
+        owner=request.user,
+    )
+    try:
+        date = parse_due_date(date)
+    except ValueError:
+        raise Http404
+    if template.due_date is None or date not in template.recurrence.dates(
+        template.due_date, date, date
+    ):
+        raise Http404
+    if template.skipped_occurrences.filter(occurrence_date=date).exists():
+        raise Http404
+
+    with transaction.atomic():
+        # The occurrence becomes a real To-Do the first time it is edited
+        todo, created = Todo.objects.get_or_create(
+            series=template,
+            occurrence_date=date,
+            defaults={
+                "owner": request.user,
+                "title": template.title,
+                "description": template.description,
+                "due_date": date,
+            },
+        )
+        if created:
+            todo.tags.set(template.tags.all())
+            publish_todo_event(
+                "created",
+                todo.id,
+                request.user.id,
+                title=todo.title,
+                due_date=date,
+                status=todo.status,
+            )
+        response = _update_todo(request, todo.id)
+        if response.status_code >= 400:
+            transaction.set_rollback(True)
+    return response
+
+
 # Delete To-Do
 @api_view(["DELETE"])
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
 def deletetodo(request, id):
-    todo = get_object_or_404(Todo, id=id)
-    todo.delete()
+    todo = get_object_or_404(Todo, id=id, owner=request.user)
+    # Subtasks go with their parent, the whole subtree in one range
+    subtree = Todo.objects.subtree(todo.path)
+    with transaction.atomic():
+        ids = list(subtree.values_list("id", flat=True))
+        todos_deleting(subtree)
+        subtree.skip_occurrences()
+        subtree.delete()
+        for todo_id in ids:
+            publish_todo_event("deleted", todo_id, request.user.id)
+        todos_changed([request.user.id])
+        owner_tags_changed([request.user.id])
     return JsonResponse(
         {"message": f"To-Do item with ID {id} deleted successfully!"},
         status=st.HTTP_200_OK,
     )
 
 
+# Move a To-Do with its subtasks under another parent
+@api_view(["PATCH"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def movetodo(request, id):
+    todo = get_object_or_404(Todo, id=id, owner=request.user)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict) or "parent" not in data:
+        return JsonResponse(
+            {"error": "Parent is a required field!"}, status=st.HTTP_400_BAD_REQUEST
+        )
+
+    parent, error = None, None
+    if data["parent"] is not None:
+        parent, error = _parent(request, data["parent"])
+    if not error and parent and parent.path.startswith(todo.path):
+        error = "A To-Do item cannot be moved under its own subtasks!"
+    if not error:
+        subtree = Todo.objects.subtree(todo.path)
+        deepest = subtree.aggregate(deepest=Max("depth"))["deepest"]
+        new_depth = parent.depth + 1 if parent else 0
+        if deepest - todo.depth + new_depth > MAX_DEPTH:
+            error = f"Subtasks cannot be nested more than {MAX_DEPTH} levels deep!"
+    if error:
+        return JsonResponse({"error": error}, status=st.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        todo.move_to(parent)
+        publish_todo_event("updated", id, request.user.id, parent_id=todo.parent_id)
+    return JsonResponse(
+        {"message": f"To-Do item with ID {id} moved successfully!", "id": id},
+        status=st.HTTP_200_OK,
+    )
+
+
+# Show a To-Do with all of its subtasks
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def showsubtree(request, id):
+    todo = get_object_or_404(Todo, id=id, owner=request.user)
+    todos = Todo.objects.subtree(todo.path)
+    return JsonResponse(
+        list(todos.order_by("path").values()), safe=False, status=st.HTTP_200_OK
+    )
+
+
+# Show completion counts of a To-Do and its subtasks
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def showprogress(request, id):
+    todo = get_object_or_404(Todo, id=id, owner=request.user)
+    counts = dict(
+        Todo.objects.subtree(todo.path)
+        .order_by()
+        .values_list("status")
+        .annotate(count=Count("id"))
+    )
+    total = sum(counts.values())
+    completed = counts.get("COMPLETED", 0)
+    return JsonResponse(
+        {
+            "id": id,
+            "total": total,
+            "completed": completed,
+            "percent_completed": round(100 * completed / total, 1),
+            "statuses": counts,
+        },
+        status=st.HTTP_200_OK,
+    )
+
+
 # Show All To-Dos
 @api_view(["GET"])
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
 def showtodos(request):
-    todos = Todo.objects.all().values()
-    return JsonResponse(list(todos), safe=False, status=st.HTTP_200_OK)
+    return _list_todos(request)
 
 
 # Show To-Do by ID
@@ -201,7 +564,10 @@ def showtodos(request):
 @authentication_classes([BasicAuthentication])
 @permission_classes([IsAuthenticated])
 def showtodo(request, id):
-    todo = get_object_or_404(Todo, id=id)
+    todo = get_object_or_404(
+        Todo.objects.select_related("recurrence"), id=id, owner=request.user
+    )
+    recurrence = getattr(todo, "recurrence", None)
     # Exclude private attributes
     todo_data = {
         "id": todo.id,
@@ -209,6 +575,235 @@ def showtodo(request, id):
         "description": todo.description,
         "due_date": todo.due_date,
         "status": todo.status,
-        "tags": todo.tags,
+        "tags": list(todo.tags.values_list("name", flat=True)),
+        "version": todo.version,
+        "series_id": todo.series_id,
+        "occurrence_date": todo.occurrence_date,
+        "parent_id": todo.parent_id,
+        "depth": todo.depth,
     }
-    return JsonResponse(todo_data, status=st.HTTP_200_OK)
+    if recurrence:
+        todo_data["recurrence"] = {
+            "frequency": recurrence.frequency,
+            "interval": recurrence.interval,
+            "until": recurrence.until,
+            "count": recurrence.count,
+        }
+    return JsonResponse(
+        todo_data, status=st.HTTP_200_OK, headers={"ETag": f'"{todo.version}"'}
+    )
+
+
+# Show To-Dos that are overdue or due soon
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def duesoon(request):
+    try:
+        days = int(request.GET.get("days", 7))
+    except ValueError:
+        days = -1
+    if days < 0 or days > 365:
+        return JsonResponse(
+            {"error": "Days should be a number between 0 and 365!"},
+            status=st.HTTP_400_BAD_REQUEST,
+        )
+    todos = Todo.objects.filter(owner=request.user)
+    rows = list(todos.concrete().due_within(days).values())
+    # Occurrences of recurring To-Dos are only reported from today on
+    today = datetime.date.today()
+    occurrences = _occurrences(
+        todos.templates().actionable(), today, today + datetime.timedelta(days=days)
+    )
+    if occurrences:
+        rows = list(heapq.merge(rows, occurrences, key=lambda row: row["due_date"]))
+    return JsonResponse(rows, safe=False, status=st.HTTP_200_OK)
+
+
+# Suggest tags for autocomplete
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def tagautocomplete(request):
+    prefix = request.GET.get("q", "").strip()
+    try:
+        limit = int(request.GET.get("limit", 10))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > 50:
+        return JsonResponse(
+            {"error": "Limit should be a number between 1 and 50!"},
+            status=st.HTTP_400_BAD_REQUEST,
+        )
+    tags = tag_index.suggest(request.user.id, prefix, limit)
+    return JsonResponse(tags, safe=False, status=st.HTTP_200_OK)
+
+
+# Find To-Dos by a tag expression, e.g. "work AND (urgent OR NOT later)"
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def tagquery(request):
+    try:
+        tree = parse_tag_query(request.GET.get("q", ""))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=st.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.GET.get("limit", 50))
+        offset = int(request.GET.get("offset", 0))
+    except ValueError:
+        limit = offset = -1
+    if limit < 1 or limit > 100 or offset < 0:
+        return JsonResponse(
+            {"error": "Limit should be between 1 and 100 and offset not negative!"},
+            status=st.HTTP_400_BAD_REQUEST,
+        )
+    ids = tag_query(request.user.id, tree)
+    page = list(ids[offset : offset + limit])
+    rows = list(
+        Todo.objects.filter(owner=request.user, id__in=page).order_by("id").values()
+    )
+    return JsonResponse(
+        {"count": len(ids), "results": rows}, safe=False, status=st.HTTP_200_OK
+    )
+
+
+async def _sse_user(request):
+    # DRF views are sync only, run the Basic authentication ourselves
+    try:
+        result = await sync_to_async(BasicAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+# Stream To-Do changes as Server-Sent Events, served through project01.asgi
+async def todoevents(request):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user = await _sse_user(request)
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=st.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": 'Basic realm="api"'},
+        )
+
+    status = request.GET.get("status") or None
+    tag = request.GET.get("tag") or None
+    heartbeat = getattr(settings, "TODO_EVENTS_HEARTBEAT", 15)
+
+    async def stream():
+        # Subscribe once the server starts streaming, so nothing is left
+        # behind when the response is never sent
+        subscription = hub.subscribe(user.id, status=status, tag=tag)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                events, dropped = await subscription.get(heartbeat)
+                if dropped:
+                    # The client fell behind, it has to refetch its state
+                    data = json.dumps({"dropped": dropped})
+                    yield f"event: overflow\ndata: {data}\n\n"
+                for event in events:
+                    data = json.dumps(event, cls=DjangoJSONEncoder)
+                    yield f"event: {event['type']}\ndata: {data}\n\n"
+                if not events and not dropped:
+                    yield ": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _job_data(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "cancel_requested": job.cancel_requested,
+        "done": job.done,
+        "total": job.total,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# Submit a background job
+@api_view(["POST"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def submitjob(request):
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse(
+            {"error": "Invalid JSON format"}, status=st.HTTP_400_BAD_REQUEST
+        )
+    kind = data.get("kind")
+    params = data.get("params", {})
+    error = validate_params(kind, params)
+    if error:
+        return JsonResponse({"error": error}, status=st.HTTP_400_BAD_REQUEST)
+    job = Job.objects.create(owner=request.user, kind=kind, params=params)
+    return JsonResponse(_job_data(job), status=st.HTTP_202_ACCEPTED)
+
+
+# Show the progress of a background job
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def showjob(request, id):
+    job = get_object_or_404(Job, id=id, owner=request.user)
+    return JsonResponse(_job_data(job), status=st.HTTP_200_OK)
+
+
+# Cancel a background job
+@api_view(["POST"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def canceljob(request, id):
+    jobs = Job.objects.filter(id=id, owner=request.user)
+    # Queued jobs are cancelled right away, running ones stop after their
+    # current chunk
+    if not jobs.filter(status="QUEUED").update(
+        status="CANCELLED", cancel_requested=True, finished_at=timezone.now()
+    ):
+        jobs.filter(status="RUNNING").update(cancel_requested=True)
+    job = get_object_or_404(jobs)
+    if job.status in ("SUCCEEDED", "FAILED"):
+        return JsonResponse(
+            {"error": f"Job already {job.status.lower()}!"},
+            status=st.HTTP_409_CONFLICT,
+        )
+    return JsonResponse(_job_data(job), status=st.HTTP_200_OK)
+
+
+# Download the file written by an export job
+@api_view(["GET"])
+@authentication_classes([BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def downloadjob(request, id):
+    job = get_object_or_404(Job, id=id, owner=request.user, kind="export")
+    if job.status != "SUCCEEDED":
+        return JsonResponse(
+            {"error": "Export is not finished yet!"}, status=st.HTTP_409_CONFLICT
+        )
+    path = os.path.join(settings.TODO_EXPORT_DIR, job.result["file"])
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(
+        open(path, "rb"),
+        as_attachment=True,
+        filename=job.result["file"],
+        content_type="application/x-ndjson",
+    )